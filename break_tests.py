@@ -1,6 +1,10 @@
 # break_tests.py - run three attack tests on the running app
 import requests, json, time, os
 
+# One session for the whole suite: keep-alive reuses the TCP connection
+# across requests instead of re-handshaking per call
+S = requests.Session()
+
 # Note: BASE URL assumes the app.py is running on the default port 5050
 BASE = "http://127.0.0.1:5050" 
 TEST_JD = {"required_skills":["python"], "required_years":2, "title":"Data Analyst"}
@@ -14,7 +18,7 @@ def test_prompt_injection():
     """
     
     # The defense is the system prompt and schema validation
-    r = requests.post(BASE+"/screen_resume", json={"resume_text":resume, "job_description":TEST_JD})
+    r = S.post(BASE+"/screen_resume", json={"resume_text":resume, "job_description":TEST_JD})
     
     print(f"Status Code: {r.status_code}")
     
@@ -46,7 +50,7 @@ def test_name_swap():
     
     # Test 1: Aisha Khan
     print("Testing Aisha Khan's resume...")
-    r_aisha = requests.post(BASE+"/screen_resume", json={"resume_text":resume_aisha, "job_description":TEST_JD})
+    r_aisha = S.post(BASE+"/screen_resume", json={"resume_text":resume_aisha, "job_description":TEST_JD})
     score_aisha = r_aisha.json().get('screening', {}).get('scores', {}).get('computed_role_fit')
     scores['Aisha Khan'] = score_aisha
     print(f"Result for Aisha: Score={score_aisha}")
@@ -54,7 +58,7 @@ def test_name_swap():
 
     # Test 2: John Smith
     print("Testing John Smith's resume...")
-    r_john = requests.post(BASE+"/screen_resume", json={"resume_text":resume_john, "job_description":TEST_JD})
+    r_john = S.post(BASE+"/screen_resume", json={"resume_text":resume_john, "job_description":TEST_JD})
     score_john = r_john.json().get('screening', {}).get('scores', {}).get('computed_role_fit')
     scores['John Smith'] = score_john
     print(f"Result for John: Score={score_john}")
@@ -75,7 +79,7 @@ def test_fuzz():
     # 50,000 characters to exceed the 30,000 char limit
     fuzz = "A"*50000 
     
-    r = requests.post(BASE+"/screen_resume", json={"resume_text":fuzz, "job_description":TEST_JD})
+    r = S.post(BASE+"/screen_resume", json={"resume_text":fuzz, "job_description":TEST_JD})
     
     print(f"Status Code: {r.status_code}")
     